@@ -1,16 +1,132 @@
 # main.py - Clean version with your trained model
+import os
+
+# These must be set before TensorFlow is imported
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+# CPU-only deploys opt in with CPU_ONLY=1 to skip GPU/CUDA initialization
+if os.environ.get("CPU_ONLY") == "1":
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+# oneDNN JIT conv/matmul kernels (AVX2/AVX-512, and VNNI int8 on hosts that
+# have it). On by default in x86 tensorflow-cpu >= 2.9; set explicitly so
+# older builds use it too
+os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1")
+# Keep downloaded TF-Hub modules on disk across restarts
+os.environ.setdefault("TFHUB_CACHE_DIR", "/tmp/tfhub")
+# Largest image we'll decode (~150 MB as BGR). A tiny PNG can declare huge
+# dimensions, so the byte cap alone doesn't bound decode memory. OpenCV reads
+# its own limit from the environment when it is imported
+MAX_IMAGE_PIXELS = 50_000_000
+os.environ.setdefault("OPENCV_IO_MAX_IMAGE_PIXELS", str(MAX_IMAGE_PIXELS))
+
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+import asyncio
 import io
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
-import os
+import orjson
+from PIL import Image
+
+# CPUs this process may actually run on (respects affinity/cpusets, unlike
+# os.cpu_count()), shared between the uvicorn workers on the host. Set
+# WEB_CONCURRENCY to the worker count (uvicorn also reads it for --workers)
+AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+WORKER_CPUS = max(1, AVAILABLE_CPUS // int(os.environ.get("WEB_CONCURRENCY", "1")))
+# Decoding is short and bursty; inference (one batch at a time) gets the rest
+PREPROCESS_THREADS = max(1, WORKER_CPUS // 4)
+INFERENCE_THREADS = max(1, WORKER_CPUS - PREPROCESS_THREADS)
+
+# TensorFlow (~1-3 s and hundreds of MB) is only imported once a model is built
+_tf = None
+
+def _get_tf():
+    """Import TensorFlow on first use"""
+    global _tf
+    if _tf is None:
+        import tensorflow as tf
+        # Pin TF's thread pools instead of letting it oversubscribe the uvicorn worker
+        # (same fix as torch.set_num_threads in PyTorch)
+        tf.config.threading.set_intra_op_parallelism_threads(INFERENCE_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        _tf = tf
+    return _tf
+
+# Upload limits
+MAX_UPLOAD_BYTES = 8 << 20
+UPLOAD_CHUNK_BYTES = 1 << 20
+MULTIPART_OVERHEAD_BYTES = 64 << 10  # boundaries/headers around the file in the request body
+
+class _BodyTooLarge(Exception):
+    pass
+
+class UploadLimitMiddleware:
+    """Cap /predict request bodies before FastAPI reads and spools the multipart form"""
+    
+    def __init__(self, app, path, max_body_bytes):
+        self.app = app
+        self.path = path
+        self.max_body_bytes = max_body_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                length = int(content_length)
+            except ValueError:
+                await self._reject(scope, receive, send, 400, "Invalid Content-Length header")
+                return
+            if length > self.max_body_bytes:
+                await self._reject(scope, receive, send, 413, "Image too large")
+                return
+        
+        # Chunked uploads have no Content-Length, so also count the stream itself
+        received = 0
+        exceeded = False
+        
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+        
+        async def guarded_send(message):
+            # FastAPI turns body-parsing errors into a generic 400; swallow it
+            # and answer with the real reason below
+            if not exceeded:
+                await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded:
+            await self._reject(scope, receive, send, 413, "Image too large")
+    
+    @staticmethod
+    async def _reject(scope, receive, send, status_code, detail):
+        await JSONResponse({"detail": detail}, status_code=status_code)(scope, receive, send)
 
-app = FastAPI(title="Dog Breed Predictor - Real Model")
+app = FastAPI(title="Dog Breed Predictor - Real Model", default_response_class=ORJSONResponse)
 
+# Added before CORS so CORS stays outermost and 413s still carry CORS headers
+app.add_middleware(
+    UploadLimitMiddleware,
+    path="/predict",
+    max_body_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,9 +137,34 @@ app.add_middleware(
 )
 
 # Global variables for model and breeds
-model = None
+predict_fn = None
+total_parameters = None
+batch_queue = None
+batch_task = None
 breeds = None
+breeds_titled = None
+breeds_response = None
 IMG_SIZE = 224
+MODEL_URL = "https://kaggle.com/models/google/mobilenet-v2/TensorFlow2/100-224-feature-vector/1"
+FEATURE_DIM = 1280  # MobileNetV2 feature vector size
+
+# Micro-batching: concurrent /predict requests share one inference call
+MAX_BATCH_SIZE = 8
+
+# Inference runs off the event loop; a single worker also keeps the (not
+# thread-safe) TFLite interpreter to one caller at a time
+INFER_POOL = ThreadPoolExecutor(max_workers=1)
+# Decoding a large upload takes milliseconds; do it off the event loop too so
+# the batch worker keeps collecting requests (OpenCV releases the GIL)
+PREPROCESS_POOL = ThreadPoolExecutor(max_workers=PREPROCESS_THREADS)
+
+# Your trained model weights - your exact filename first
+WEIGHTS_PATHS = [
+    "20250619-08341750322059-full-dataset-dog-mobilenetv2-cj.weights.h5",
+]
+
+# Bump whenever create_model() changes so stale TFLite conversions are rebuilt
+GRAPH_VERSION = 3
 
 def load_breeds():
     """Load the breeds from JSON file"""
@@ -36,21 +177,30 @@ def load_breeds():
 
 def create_model():
     """Create the same model architecture as your Colab training code"""
+    tf = _get_tf()
+    # Shared, cached hub.load() (imported here to keep TF off the import path)
+    from create_model import load_feature_extractor
+    
     INPUT_SHAPE = [None, IMG_SIZE, IMG_SIZE, 3]
     OUTPUT_SHAPE = len(breeds)
-    MODEL_URL = "https://kaggle.com/models/google/mobilenet-v2/TensorFlow2/100-224-feature-vector/1"
     
     print("Building model with:", MODEL_URL)
     
-    # EXACT same architecture as your Colab code
+    # EXACT same architecture as your Colab code. The Lambda stays (Keras 3 can't
+    # add hub.KerasLayer to a Sequential, and the saved weights only hold the
+    # Dense head), but it now calls the loaded SavedModel directly instead of
+    # building a KerasLayer inside the trace
     model = tf.keras.Sequential([
-        tf.keras.layers.InputLayer(input_shape=INPUT_SHAPE[1:]),
-        tf.keras.layers.Lambda(lambda x: hub.KerasLayer(MODEL_URL)(x)),
-        tf.keras.layers.Dense(units=OUTPUT_SHAPE, activation="softmax")
+        # Raw uint8 pixels in; the 0-1 normalization lives in the graph
+        tf.keras.layers.InputLayer(input_shape=INPUT_SHAPE[1:], dtype=tf.uint8),
+        tf.keras.layers.Rescaling(1. / 255.),
+        tf.keras.layers.Lambda(lambda x: load_feature_extractor(MODEL_URL)(x, training=False)),
+        # Outputs logits; softmax is applied outside the graph in get_top_predictions
+        tf.keras.layers.Dense(units=OUTPUT_SHAPE, activation=None)
     ])
     
     model.compile(
-        loss=tf.keras.losses.CategoricalCrossentropy(),
+        loss=tf.keras.losses.CategoricalCrossentropy(from_logits=True),
         optimizer=tf.keras.optimizers.Adam(),
         metrics=["accuracy"]
     )
@@ -69,79 +219,406 @@ def load_trained_model(weights_path):
         print(f"Error loading model weights: {e}")
         return None
 
-def preprocess_image(image: Image.Image):
-    """Preprocess image exactly like your Colab training pipeline"""
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+def make_concrete_function(model):
+    """Trace the model once into a concrete function with a fixed input signature"""
+    tf = _get_tf()
+    @tf.function(input_signature=[tf.TensorSpec([None, IMG_SIZE, IMG_SIZE, 3], tf.uint8)])
+    def infer(x):
+        return model(x, training=False)
+    return infer.get_concrete_function()
+
+def convert_to_tflite(model):
+    """Convert a Keras model to a float32 TFLite flatbuffer"""
+    tf = _get_tf()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([make_concrete_function(model)], model)
+    converter.optimizations = []
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+def model_stem(weights_path):
+    """Strip the .weights.h5 / .h5 suffix from a weights filename"""
+    if weights_path.endswith(".weights.h5"):
+        return weights_path[:-len(".weights.h5")]
+    return os.path.splitext(weights_path)[0]
+
+def tflite_cache_path(weights_path):
+    """Cache file for the TFLite conversion, keyed by the weights file mtime"""
+    mtime = int(os.path.getmtime(weights_path))
+    return f"{model_stem(weights_path)}.v{GRAPH_VERSION}-{mtime}.tflite"
+
+def fp16_tflite_path(weights_path):
+    """float16 export written by `python main.py export-fp16`, keyed like the cache above"""
+    mtime = int(os.path.getmtime(weights_path))
+    return f"{model_stem(weights_path)}.fp16.v{GRAPH_VERSION}-{mtime}.tflite"
+
+def export_fp16(weights_path=None):
+    """Write the float16 TFLite export that startup prefers over the .weights.h5 file"""
+    global breeds
+    from create_model import export_fp16_tflite
+    
+    weights_path = weights_path or WEIGHTS_PATHS[0]
+    # create_model() sizes the Dense head from the breeds list
+    breeds = load_breeds()
+    if breeds == -1:
+        raise SystemExit("breeds.json is required to export the model")
+    model = load_trained_model(weights_path)
+    if model is None:
+        raise SystemExit(f"Could not load weights from: {weights_path}")
+    
+    fp16_path = fp16_tflite_path(weights_path)
+    export_fp16_tflite(model, fp16_path)
+    print(f"Wrote float16 TFLite model to: {fp16_path}")
+
+def tflite_runner(tflite_bytes):
+    """Wrap TFLite interpreters (XNNPACK float kernels are the default on x86) as images -> predictions"""
+    tf = _get_tf()
+    # One interpreter per exact batch size (1..MAX_BATCH_SIZE), each resized and
+    # allocated exactly once, so mixed batch sizes never re-plan tensors or
+    # re-init XNNPACK. No padding: per-image cost barely drops with batch size
+    interpreters = {}
+    
+    def interpreter_for(batch_size):
+        if batch_size not in interpreters:
+            # Only one interpreter runs at a time (INFER_POOL has one worker),
+            # so each can use all the inference threads
+            interpreter = tf.lite.Interpreter(model_content=tflite_bytes, num_threads=INFERENCE_THREADS)
+            input_details = interpreter.get_input_details()[0]
+            if input_details['dtype'] != np.uint8:
+                raise ValueError("TFLite model expects float input - re-export it from the current create_model()")
+            interpreter.resize_tensor_input(input_details['index'], (batch_size, IMG_SIZE, IMG_SIZE, 3))
+            interpreter.allocate_tensors()
+            interpreters[batch_size] = (
+                interpreter,
+                input_details['index'],
+                interpreter.get_output_details()[0]['index'],
+            )
+        return interpreters[batch_size]
+    
+    # Build the batch-1 interpreter now so a bad model fails at load time
+    interpreter_for(1)
+    
+    def run(images):
+        interpreter, input_index, output_index = interpreter_for(len(images))
+        
+        # Copy each image straight into the interpreter's own input buffer
+        # (no concatenated batch, no set_tensor memcpy). The numpy view must
+        # be dropped before invoke()
+        input_view = interpreter.tensor(input_index)()
+        for i, image in enumerate(images):
+            input_view[i] = image[0]
+        del input_view
+        
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index)
+    
+    return run
+
+def concrete_runner(model):
+    """Serve a Keras model through its traced concrete function (no Keras predict() overhead)"""
+    tf = _get_tf()
+    # No jit_compile: XLA CPU handles MobileNetV2's depthwise convs poorly and
+    # measured ~10x slower than the plain traced graph
+    concrete = make_concrete_function(model)
+    return lambda images: concrete(tf.constant(np.concatenate(images))).numpy()
+
+def cpu_supports_bf16():
+    """Check /proc/cpuinfo for AVX512-BF16 / AMX-BF16 support (Linux only)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = line.split()
+                    return "avx512_bf16" in flags or "amx_bf16" in flags
+    except OSError:
+        pass
+    return False
+
+def bf16_runner(model):
+    """Serve a Keras model in bfloat16 through TF/oneDNN (TFLite has no bf16 kernels)"""
+    tf = _get_tf()
+    # Grappler rewrites the whole traced graph, including the TF-Hub convs that a
+    # Keras mixed_bfloat16 policy can't reach through the Lambda, to bf16
+    tf.config.optimizer.set_experimental_options({"auto_mixed_precision_onednn_bfloat16": True})
+    return concrete_runner(model)
+
+def write_tflite_cache(cache_path, tflite_bytes):
+    """Atomically write the TFLite cache; a failed write only means converting again next start"""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(tflite_bytes)
+        # Readers (other --workers) only ever see a complete file
+        os.replace(tmp_path, cache_path)
+        print(f"Cached TFLite model at: {cache_path}")
+    except OSError as e:
+        print(f"WARNING: Could not cache TFLite model at {cache_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def keras_runner(model, cache_path=None):
+    """Serve a Keras model via TFLite, falling back to its concrete function if that fails"""
+    try:
+        print("Converting model to TFLite...")
+        tflite_bytes = convert_to_tflite(model)
+        runner = tflite_runner(tflite_bytes)
+    except Exception as e:
+        print(f"TFLite unavailable, serving the traced TF function instead: {e}")
+        return concrete_runner(model)
     
-    # Resize to 224x224 (same as training)
-    image = image.resize((IMG_SIZE, IMG_SIZE))
+    if cache_path is not None:
+        write_tflite_cache(cache_path, tflite_bytes)
+    return runner
+
+def load_tflite_model(weights_path):
+    """Load your trained model for serving, reusing a cached TFLite conversion when possible"""
+    cache_path = tflite_cache_path(weights_path)
+    if os.path.exists(cache_path):
+        try:
+            print(f"Loading cached TFLite model from: {cache_path}")
+            with open(cache_path, 'rb') as f:
+                return tflite_runner(f.read())
+        except Exception as e:
+            # Truncated/corrupt cache (e.g. a crashed write): drop it and rebuild
+            print(f"WARNING: Cached TFLite model is unusable, rebuilding from weights: {e}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
     
-    # Convert to array and normalize to 0-1 (same as training)
-    img_array = np.array(image, dtype=np.float32) / 255.0
+    try:
+        model = load_trained_model(weights_path)
+        if model is None:
+            return None
+        return keras_runner(model, cache_path)
+    except Exception as e:
+        print(f"Error building TFLite model: {e}")
+        return None
+
+def load_tflite_file(tflite_path):
+    """Load a pre-exported TFLite model (e.g. the float16 export)"""
+    try:
+        print(f"Loading TFLite model from: {tflite_path}")
+        with open(tflite_path, 'rb') as f:
+            return tflite_runner(f.read())
+    except Exception as e:
+        print(f"Error loading TFLite model: {e}")
+        return None
+
+# Per-PREPROCESS_POOL-thread uint8 scratch buffer so the resize never allocates
+_scratch = threading.local()
+
+def _resize_buffer():
+    """Get this thread's 224x224x3 uint8 resize buffer"""
+    buffer = getattr(_scratch, "resized", None)
+    if buffer is None:
+        buffer = _scratch.resized = np.empty((IMG_SIZE, IMG_SIZE, 3), np.uint8)
+    return buffer
+
+class ImageDecodeError(ValueError):
+    """The upload isn't an image we can decode"""
+
+class ImageTooLargeError(ValueError):
+    """The upload decodes to more than MAX_IMAGE_PIXELS"""
+
+def check_image_dimensions(image_bytes):
+    """Reject decompression bombs from the header alone (PIL doesn't decode pixels here)"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as pil_image:
+            width, height = pil_image.size
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError("Image dimensions too large")
+    except (OSError, ValueError):
+        # Not a format PIL can read; OPENCV_IO_MAX_IMAGE_PIXELS still caps imdecode
+        return
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image dimensions too large ({width}x{height})")
+
+def decode_image(image_bytes):
+    """Decode the upload bytes into a BGR uint8 array without copying the bytes"""
+    check_image_dimensions(image_bytes)
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        # OpenCV < 4.11 can't decode GIF (which the frontend accepts); let PIL try
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as pil_image:
+                rgb = np.asarray(pil_image.convert("RGB"))
+        except (OSError, ValueError, Image.DecompressionBombError):
+            raise ImageDecodeError("Could not decode image")
+        image = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    return image
+
+def preprocess_image(image):
+    """Preprocess image exactly like your Colab training pipeline"""
+    resized = _resize_buffer()
     
-    # Add batch dimension
-    img_array = np.expand_dims(img_array, axis=0)
+    # Resize to 224x224 (same as training); converting colour after the
+    # resize touches 224x224 pixels instead of the full upload
+    cv2.resize(image, (IMG_SIZE, IMG_SIZE), dst=resized, interpolation=cv2.INTER_LINEAR)
     
+    # Stays uint8: the model's Rescaling layer does the 0-1 normalization
+    img_array = np.empty((1, IMG_SIZE, IMG_SIZE, 3), np.uint8)
+    cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=img_array[0])
     return img_array
 
-def get_pred_label(prediction_probabilities):
-    """Get predicted label from probabilities"""
-    return breeds[np.argmax(prediction_probabilities)]
+def load_image(image_bytes):
+    """Decode + preprocess an upload (runs on PREPROCESS_POOL); returns (image, height, width)"""
+    image = decode_image(image_bytes)
+    height, width = image.shape[:2]
+    return preprocess_image(image), height, width
+
+async def read_upload(file: UploadFile):
+    """Read the upload in chunks, rejecting it as soon as it exceeds MAX_UPLOAD_BYTES"""
+    buf = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        buf += chunk
+        if len(buf) > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image too large (max {MAX_UPLOAD_BYTES // (1 << 20)} MB)"
+            )
+    return buf
 
-def get_top_predictions(prediction_probabilities, top_k=3):
+async def batch_worker():
+    """Collect queued images into batches of up to MAX_BATCH_SIZE and predict them together"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Only take what is already queued - never wait for more. Requests that
+        # arrive while a batch is running pile up and form the next batch, so
+        # batching happens under load and adds no latency when idle
+        batch = [await batch_queue.get()]
+        while len(batch) < MAX_BATCH_SIZE and not batch_queue.empty():
+            batch.append(batch_queue.get_nowait())
+        
+        try:
+            images = [image for image, _ in batch]
+            predictions = await loop.run_in_executor(INFER_POOL, predict_fn, images)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        
+        # Hand each caller its own (1, num_breeds) slice
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(predictions[i:i + 1])
+
+async def predict_batched(processed_image):
+    """Queue one preprocessed image for the batch worker and wait for its prediction"""
+    future = asyncio.get_running_loop().create_future()
+    await batch_queue.put((processed_image, future))
+    return await future
+
+def get_top_predictions(logits, top_k=3):
     """Get top K predictions with confidence scores"""
-    top_indices = np.argsort(prediction_probabilities[0])[-top_k:][::-1]
+    scores = logits[0]
+    # O(N) partial selection, then sort only the k survivors (softmax doesn't change the ranking)
+    top_indices = np.argpartition(scores, -top_k)[-top_k:]
+    top_indices = top_indices[np.argsort(-scores[top_indices])]
+    
+    # Softmax over all breeds so confidences stay true probabilities
+    exp_scores = np.exp(scores - scores[top_indices[0]])
+    confidences = exp_scores[top_indices] / exp_scores.sum()
     
     predictions = []
-    for idx in top_indices:
+    for idx, confidence in zip(top_indices, confidences):
         predictions.append({
-            "breed": breeds[idx].replace("_", " ").title(),
-            "confidence": float(prediction_probabilities[0][idx])
+            "breed": breeds_titled[idx],
+            "confidence": confidence  # numpy scalar; ORJSONResponse serializes it directly
         })
     
     return predictions
 
 @app.on_event("startup")
 async def startup_event():
-    global model, breeds
+    global predict_fn, breeds, breeds_titled, breeds_response, total_parameters
+    global batch_queue, batch_task
     
     print("Starting up Dog Breed Predictor...")
     
+    # Check breeds before touching TensorFlow so a broken deploy fails fast
     breeds = load_breeds()
+    if breeds == -1:
+        breeds = None
+        print("WARNING: No breeds loaded - starting without a model!")
+        return
     print(f"Loaded {len(breeds)} dog breeds")
+    # What model.count_params() reports: only the Dense head is tracked (the
+    # TF-Hub module sits inside the Lambda), so this holds on every load path
+    total_parameters = (FEATURE_DIM + 1) * len(breeds)
+    breeds_titled = tuple(breed.replace("_", " ").title() for breed in breeds)
+    # /breeds never changes, so serialize it once
+    breeds_response = orjson.dumps({
+        "total_breeds": len(breeds),
+        "breeds": breeds_titled
+    })
     
-    # Try to load your trained model weights - your exact filename first
-    weights_paths = [
-        "20250619-08341750322059-full-dataset-dog-mobilenetv2-cj.weights.h5",
-    ]
+    # Float TFLite (XNNPACK) is the default and measured fastest even on AMX-BF16
+    # hosts; bf16 through full TF/oneDNN is an explicit opt-in (USE_BF16=1) for
+    # benchmarking. int8 is slower than fp32 on x86 either way
+    use_bf16 = os.environ.get("USE_BF16") == "1"
+    if use_bf16 and not cpu_supports_bf16():
+        print("WARNING: USE_BF16=1 but this CPU has no AVX512-BF16/AMX-BF16 - using TFLite")
+        use_bf16 = False
+    if use_bf16:
+        print("USE_BF16=1 - serving with TF/oneDNN bf16 instead of TFLite")
     
     model_loaded = False
-    for weights_path in weights_paths:
-        if os.path.exists(weights_path):
-            model = load_trained_model(weights_path)
-            if model is not None:
+    # Try to load your trained model weights
+    for weights_path in WEIGHTS_PATHS:
+        if not os.path.exists(weights_path):
+            print(f"❌ Model not found at: {weights_path}")
+            continue
+        
+        # Prefer the float16 export (only if it matches these weights and the
+        # current graph): half the weight bytes, same float kernels
+        fp16_path = fp16_tflite_path(weights_path)
+        if not use_bf16 and os.path.exists(fp16_path):
+            predict_fn = load_tflite_file(fp16_path)
+            if predict_fn is not None:
                 model_loaded = True
-                print(f"Successfully loaded TRAINED model from: {weights_path}")
+                print(f"Successfully loaded TRAINED model from: {fp16_path}")
                 break
+        
+        if use_bf16:
+            model = load_trained_model(weights_path)
+            predict_fn = bf16_runner(model) if model is not None else None
         else:
-            print(f"❌ Model not found at: {weights_path}")
+            predict_fn = load_tflite_model(weights_path)
+        if predict_fn is not None:
+            model_loaded = True
+            print(f"Successfully loaded TRAINED model from: {weights_path}")
+            break
     
     if not model_loaded:
         print("No trained model found. Creating fresh model...")
         print("Available model files in current directory:")
         for file in os.listdir("."):
-            if file.endswith((".h5", ".weights.h5")):
+            if file.endswith((".h5", ".weights.h5", ".tflite")):
                 print(f"  - {file}")
         model = create_model()
+        predict_fn = bf16_runner(model) if use_bf16 else keras_runner(model)
         print("WARNING: Using untrained model - predictions will be random!")
+    
+    # Pay tracing/allocation/kernel-selection cost for every batch size here
+    # instead of on the first requests that hit it
+    start = time.perf_counter()
+    dummy = np.zeros((1, IMG_SIZE, IMG_SIZE, 3), np.uint8)
+    for batch_size in range(1, MAX_BATCH_SIZE + 1):
+        predict_fn([dummy] * batch_size)
+    print(f"Model warmup took {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    batch_queue = asyncio.Queue()
+    batch_task = asyncio.create_task(batch_worker())
 
 @app.get("/")
 def read_root():
     return {
         "message": "Dog Breed Predictor API with Real ML Model!",
         "status": "healthy",
-        "model_loaded": model is not None,
+        "model_loaded": predict_fn is not None,
         "total_breeds": len(breeds) if breeds else 0,
         "version": "2.0.0"
     }
@@ -151,26 +628,27 @@ def health_check():
     return {
         "status": "healthy",
         "service": "dog-breed-predictor",
-        "model_status": "loaded" if model is not None else "not_loaded",
-        "gpu_available": len(tf.config.list_physical_devices('GPU')) > 0,
-        "tensorflow_version": tf.__version__
+        "model_status": "loaded" if predict_fn is not None else "not_loaded",
+        "gpu_available": _tf is not None and len(_tf.config.list_physical_devices('GPU')) > 0,
+        "tensorflow_version": _tf.__version__ if _tf is not None else None,
+        "onednn_enabled": os.environ.get("TF_ENABLE_ONEDNN_OPTS") == "1"
     }
 
 @app.get("/model/info")
 def model_info():
     """Get information about the loaded model"""
-    if model is None:
+    if predict_fn is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     try:
         return {
             "model_loaded": True,
-            "input_shape": str(model.input_shape),
-            "output_shape": str(model.output_shape),
-            "total_parameters": model.count_params(),
+            "input_shape": str((None, IMG_SIZE, IMG_SIZE, 3)),
+            "output_shape": str((None, len(breeds))),
+            "total_parameters": total_parameters,
             "total_breeds": len(breeds),
             "image_size": IMG_SIZE,
-            "sample_breeds": [breed.replace("_", " ").title() for breed in breeds[:10]]
+            "sample_breeds": breeds_titled[:10]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting model info: {str(e)}")
@@ -178,14 +656,14 @@ def model_info():
 @app.get("/breeds")
 def get_breeds():
     """Get all supported dog breeds"""
-    return {
-        "total_breeds": len(breeds),
-        "breeds": [breed.replace("_", " ").title() for breed in breeds]
-    }
+    if breeds is None:
+        raise HTTPException(status_code=503, detail="Breeds not loaded")
+    
+    return Response(breeds_response, media_type="application/json")
 
 @app.post("/predict")
 async def predict_breed(file: UploadFile = File(...)):
-    if model is None:
+    if predict_fn is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     if not file.content_type.startswith('image/'):
@@ -194,37 +672,40 @@ async def predict_breed(file: UploadFile = File(...)):
             detail="File must be an image (jpg, png, etc.)"
         )
     
+    # The request body was already capped by UploadLimitMiddleware; this enforces
+    # the exact limit on the file part (outside the try so a 413 isn't turned into a 500)
+    image_data = await read_upload(file)
+    size_kb = round(len(image_data) / 1024, 2)
+    
     try:
-        # Read and process image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        
-        width, height = image.size
-        format_type = image.format
-        
-        # Preprocess image for model (SAME as Colab)
-        processed_image = preprocess_image(image)
+        # Decode and preprocess image for model (SAME as Colab)
+        processed_image, height, width = await asyncio.get_running_loop().run_in_executor(
+            PREPROCESS_POOL, load_image, image_data
+        )
+        format_type = file.content_type.split('/')[-1].upper()
         
         # Make prediction
         print("Making prediction...")
-        predictions = model.predict(processed_image, verbose=0)
+        predictions = await predict_batched(processed_image)
         
         # Get prediction results
-        top_breed = get_pred_label(predictions)
-        confidence = float(np.max(predictions[0]))
         top_3 = get_top_predictions(predictions, top_k=3)
+        top_breed = top_3[0]["breed"]
+        confidence = top_3[0]["confidence"]
         
-        return {
+        # Returned as ORJSONResponse directly: skips FastAPI's jsonable_encoder
+        # pass and lets orjson serialize the numpy scalars natively
+        return ORJSONResponse({
             "success": True,
             "filename": file.filename,
             "image_info": {
                 "width": width,
                 "height": height,
                 "format": format_type,
-                "size_kb": round(len(image_data) / 1024, 2)
+                "size_kb": size_kb
             },
             "prediction": {
-                "breed": top_breed.replace("_", " ").title(),
+                "breed": top_breed,
                 "confidence": confidence,
                 "confidence_percentage": round(confidence * 100, 1)
             },
@@ -235,8 +716,15 @@ async def predict_breed(file: UploadFile = File(...)):
                 "image_size_used": IMG_SIZE,
                 "model_trained": confidence > 0.1  # Indicator if model seems trained
             }
-        }
+        })
         
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ImageDecodeError as e:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Error processing image: {str(e)}"
+        )
     except Exception as e:
         print(f"Prediction error: {str(e)}")
         raise HTTPException(
@@ -245,5 +733,14 @@ async def predict_breed(file: UploadFile = File(...)):
         )
 
 if __name__ == "__main__":
+    import sys
+    
+    # python main.py export-fp16 [weights_path]
+    if sys.argv[1:2] == ["export-fp16"]:
+        export_fp16(*sys.argv[2:3])
+        sys.exit(0)
+    
     import uvicorn
+    # uvicorn picks uvloop + httptools automatically when installed
+    # (uvicorn[standard] in requirements.txt), falling back to asyncio/h11
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
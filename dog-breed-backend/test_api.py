@@ -2,8 +2,6 @@
 import requests
 import json
 import os
-from PIL import Image
-import io
 
 BASE_URL = "http://localhost:8000"
 